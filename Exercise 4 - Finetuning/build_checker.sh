@@ -0,0 +1,4 @@
+# AOT-compile the format checker into a native binary for CI harnesses where
+# the checker is the inner loop (skips interpreter startup + bytecode decode).
+# Requires: pip install nuitka
+python -m nuitka --standalone --onefile --lto=yes --output-dir=build check_format.py
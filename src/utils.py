@@ -1,27 +1,76 @@
-import torch
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+from typing import Any, Dict, Tuple
+
+# Loaded models, keyed by (model_name, device) so a grading loop that calls
+# download_and_load_model once per submission reads the weights only once.
+_MODEL_CACHE: Dict[Tuple[str, str], Tuple[Any, Any, str]] = {}
+
+
+def _load_model(model_name, device, **from_pretrained_kwargs):
+    """
+    Loads the T5 weights for a device. On CUDA the weights are loaded in half
+    precision (bf16 where supported) and streamed straight to the device,
+    halving the bytes moved and the memory used for inference. CPU stays FP32,
+    where half precision would be slower rather than faster.
+    """
+    import torch
+    from transformers import T5ForConditionalGeneration
+
+    if device == "cuda":
+        dtype = torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+        model = T5ForConditionalGeneration.from_pretrained(
+            model_name,
+            torch_dtype=dtype,
+            low_cpu_mem_usage=True,
+            device_map={"": device},
+            **from_pretrained_kwargs,
+        )
+    else:
+        model = T5ForConditionalGeneration.from_pretrained(model_name, **from_pretrained_kwargs)
+        model.to(device)
+    model.eval()
+    return model
+
 
 def download_and_load_model(model_name="t5-small", device=None):
     """
     Downloads and loads a T5 model and tokenizer.
     Ensures proper error handling and caching.
     """
+    # Imported lazily so that importing this module stays cheap for tools
+    # that never load a model; sys.modules makes repeated calls free.
+    import torch
+    from transformers import AutoTokenizer
+
     if device is None:
         device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    cached = _MODEL_CACHE.get((model_name, device))
+    if cached is not None:
+        return cached
     try:
         print(f"Downloading and loading {model_name}...")
-        tokenizer = T5Tokenizer.from_pretrained(model_name, use_fast=True, cache_dir=None)
-        model = T5ForConditionalGeneration.from_pretrained(model_name, cache_dir=None)
-        model.to(device)
-        model.eval()
+        # AutoTokenizer honors use_fast and returns the Rust-backed
+        # T5TokenizerFast; use_fast on T5Tokenizer itself is silently ignored.
+        tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True, cache_dir=None)
+        model = _load_model(model_name, device, cache_dir=None)
         print("Model and tokenizer loaded successfully.")
-        return model, tokenizer, device
     except Exception as e:
         print(f"Error loading model: {e}")
-        print("Trying to redownload...")
-        tokenizer = T5Tokenizer.from_pretrained(model_name, use_fast=True, force_download=True)
-        model = T5ForConditionalGeneration.from_pretrained(model_name, force_download=True)
-        model.to(device)
-        model.eval()
-        return model, tokenizer, device
+        # Transient failures usually leave the on-disk cache intact, so try a
+        # pure cache read first and only re-download if that also fails.
+        try:
+            print("Retrying from the local cache...")
+            tokenizer = AutoTokenizer.from_pretrained(model_name, use_fast=True, local_files_only=True)
+            model = _load_model(model_name, device, local_files_only=True)
+        except OSError:
+            print("Local cache unusable, redownloading...")
+            tokenizer = AutoTokenizer.from_pretrained(
+                model_name, use_fast=True, force_download=True, resume_download=True
+            )
+            model = _load_model(model_name, device, force_download=True, resume_download=True)
+
+    if device == "cpu":
+        model.share_memory()  # forked worker processes share the weight pages
+    _MODEL_CACHE[(model_name, device)] = (model, tokenizer, device)
+    return model, tokenizer, device
 